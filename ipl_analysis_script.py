@@ -1,10 +1,184 @@
+import glob
+import json
+import os
+import re
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+import numpy as np
+import pandas as pd
+
+
+# Declarative schema for the four fact tables (columns from meta_data.txt).
+# Each column spec may set:
+#   required - value must be present (not null / not a null marker)
+#   numeric  - value must parse as a number once thousands separators are removed
+#   min      - lower bound for numeric columns
+#   allowed  - closed set of accepted values
+#   pattern  - regex the value must contain
+FACT_TABLE_SCHEMAS = {
+    'fact_ipl_advertisers': {
+        'advertiser_brand': {'required': True},
+        'category': {'required': True},
+        'brand_ambassadors': {},
+        'celebrity_influence': {
+            'allowed': ['Extremely High', 'Very High', 'High', 'Medium', 'Moderate', 'Low']
+        },
+        'health_social_risk': {}
+    },
+    'fact_ipl_central_contracts': {
+        'contract_type': {'required': True},
+        'partner_sponsor_name': {'required': True},
+        'amount_in_crores_2025': {'numeric': True, 'min': 0},
+        'total_deal_value_in_crores': {'numeric': True, 'min': 0},
+        'contract_duration': {}
+    },
+    'fact_revenue_demography': {
+        'company': {'required': True},
+        'sector': {'required': True},
+        'parent': {},
+        'latest_annual_revenue': {'pattern': r'\d'},
+        'age_group': {},
+        'income_group': {},
+        'urban_population': {},
+        'demographic_notes': {}
+    },
+    'fact_summary_demography': {
+        'income_group': {'required': True},
+        'annual_income': {'required': True, 'pattern': r'\d'},
+        'estimated_user_population': {'required': True, 'pattern': r'\d'},
+        'key_characteristics': {}
+    }
+}
+
+# Derived column, source column and converter method applied per table by clean_data
+CLEANING_STEPS = {
+    'advertisers_df': [
+        ('risk_score', 'health_social_risk', '_risk_to_score'),
+        ('influence_score', 'celebrity_influence', '_influence_to_score')
+    ],
+    'contracts_df': [('amount_numeric', 'amount_in_crores_2025', '_convert_amount')],
+    'revenue_df': [('revenue_numeric', 'latest_annual_revenue', '_extract_revenue')]
+}
+
+# Placeholder strings treated as missing values during validation
+NULL_MARKERS = ['', 'n/a', 'na', 'nan', 'none', 'not disclosed', '-']
+
+# Plain decimal number once thousands separators are removed
+NUMBER_PATTERN = r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?'
+
+# Columns identifying a row in each generated table, used when diffing runs
+TABLE_KEY_COLUMNS = {
+    'Q1_Revenue': ['Contract_Type', 'Partner_Sponsor'],
+    'Q2_Risk_Index': ['Brand', 'Category'],
+    'Q3_CAGR': ['Company'],
+    'Q4_Population_Impact': ['Brand'],
+    'Q5_Celebrity': ['Celebrity'],
+    'S1_Health_Costs': ['Product_Category'],
+    'S1_Gambling_Behavior': ['Metric'],
+    'S1_Regulatory': ['Parameter'],
+    'S2_Employment': ['Employment_Sector'],
+    'S2_Tax_Revenue': ['Revenue_Stream'],
+    'E1_Balanced_Scorecard': ['Brand'],
+    'E2_AEI': ['Component'],
+    'E3_Framework': ['Strategy'],
+    'E4_Policy_Tiers': ['Tier'],
+    'E5_Player_Framework': ['Evaluation_Criteria']
+}
+
+# Unit words in income strings and their value in rupees
+INCOME_UNITS = {
+    'lakh': 1e5,
+    'lac': 1e5,
+    'crore': 1e7,
+    'cr': 1e7,
+    'thousand': 1e3,
+    'k': 1e3
+}
+
+# Optional extra dimensions a finer-grained demography file may carry
+SEGMENT_COLUMNS = ['state', 'age_group']
+
+# Income impact rows are keyed by whichever segment columns the demography file has
+TABLE_KEY_COLUMNS['S3_Income_Impact'] = ['Income_Group'] + SEGMENT_COLUMNS
+
+# Company/sector name patterns behind the risk categories used across all tables
+RISK_CATEGORY_PATTERNS = {
+    'Gaming/Betting': r'dream11|circle|poker|fantasy|betting|gambling',
+    'Pan Masala': r'vimal|kamla|rajshree|pan masala|gutkha|tobacco'
+}
+
+# Revenue unit words and their value in rupees; compound units such as "lakh crore" multiply
+REVENUE_UNITS_RS = {
+    'crore': 1e7,
+    'cr': 1e7,
+    'lakh': 1e5,
+    'lac': 1e5,
+    'million': 1e6,
+    'mn': 1e6,
+    'billion': 1e9,
+    'bn': 1e9
+}
+
+# A figure followed by one or more unit words, so labels like "FY23" are never read as amounts
+REVENUE_AMOUNT_PATTERN = (
+    r'(?<![\w.,])(\d[\d,]*(?:\.\d+)?)\s*((?:(?:' + '|'.join(REVENUE_UNITS_RS) + r')s?\b\.?\s*)+)'
+)
+
+class TableStore(MutableMapping):
+    """Dict-like table container that spills each table to Parquet and keeps a small LRU in memory"""
+
+    def __init__(self, spill_dir, cache_size=4):
+        self.spill_dir = spill_dir
+        self.cache_size = cache_size
+        self._paths = {}
+        self._cache = OrderedDict()
+        os.makedirs(spill_dir, exist_ok=True)
+
+    def __setitem__(self, table_name, df):
+        path = os.path.join(self.spill_dir, f"{table_name}.parquet")
+        df.to_parquet(path)
+        self._paths[table_name] = path
+        self._remember(table_name, df)
+
+    def __getitem__(self, table_name):
+        if table_name in self._cache:
+            self._cache.move_to_end(table_name)
+            return self._cache[table_name]
+        if table_name not in self._paths:
+            raise KeyError(table_name)
+        df = pd.read_parquet(self._paths[table_name])
+        self._remember(table_name, df)
+        return df
+
+    def __delitem__(self, table_name):
+        path = self._paths.pop(table_name)
+        self._cache.pop(table_name, None)
+        os.remove(path)
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __contains__(self, table_name):
+        return table_name in self._paths
+
+    def _remember(self, table_name, df):
+        """Cache a table as most recently used, evicting the least recently used beyond cache_size"""
+        self._cache[table_name] = df
+        self._cache.move_to_end(table_name)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
 
 
 class IPLAnalysisGenerator:
     """Generate comprehensive IPL analysis tables and visualizations"""
     
-    def __init__(self):
-        self.tables = {}
+    def __init__(self, spill_dir=None, cache_size=4):
+        # Keep tables in memory by default; spill to Parquet when a directory is given
+        self.tables = {} if spill_dir is None else TableStore(spill_dir, cache_size)
         self.setup_additional_data()
     
     def setup_additional_data(self):
@@ -46,30 +220,212 @@ class IPLAnalysisGenerator:
             'Sourav Ganguly': {'2025_brands': ['My11Circle'], 'risk': 'High', 'pattern': 'New in 2024'}
         }
 
-    def load_and_process_data(self, advertisers_file, contracts_file, revenue_file, summary_file):
-        """Load and process all CSV files"""
-        
+    def load_and_process_data(self, advertisers_file, contracts_file, revenue_file, summary_file,
+                              quarantine_dir=None, workers=None):
+        """Load and process all CSV files (rejected rows are written to quarantine_dir only if given)"""
+
         # Load CSV files
         self.advertisers_df = pd.read_csv(advertisers_file)
         self.contracts_df = pd.read_csv(contracts_file)
         self.revenue_df = pd.read_csv(revenue_file)
         self.summary_df = pd.read_csv(summary_file)
-        
+
+        # Reject rows that break the schema before they reach the analysis
+        self.validate_data(quarantine_dir)
+
         # Apply cleaning
-        self.clean_data()
-        
-    def clean_data(self):
+        self.clean_data(workers)
+
+    def validate_data(self, quarantine_dir=None):
+        """Validate loaded tables against FACT_TABLE_SCHEMAS, dropping bad rows
+
+        Rejected rows and the report are written to quarantine_dir when one is given;
+        otherwise the report is only kept in self.validation_report.
+        """
+
+        table_attrs = {
+            'fact_ipl_advertisers': 'advertisers_df',
+            'fact_ipl_central_contracts': 'contracts_df',
+            'fact_revenue_demography': 'revenue_df',
+            'fact_summary_demography': 'summary_df'
+        }
+
+        if quarantine_dir is not None:
+            os.makedirs(quarantine_dir, exist_ok=True)
+        report_data = []
+
+        for table_name, attr in table_attrs.items():
+            df = getattr(self, attr)
+            rejected, reasons, check_counts = self._validate_table(df, FACT_TABLE_SCHEMAS[table_name])
+
+            if rejected.any() and quarantine_dir is not None:
+                quarantined = df[rejected].copy()
+                quarantined['reject_reason'] = reasons.str.rstrip('; ').to_numpy()
+                filename = f"{quarantine_dir}{table_name}_rejected.csv"
+                quarantined.to_csv(filename, index=False)
+                print(f"Quarantined {int(rejected.sum())} rows: {filename}")
+
+            setattr(self, attr, df[~rejected].reset_index(drop=True))
+
+            for (column, check), failed in check_counts.items():
+                report_data.append({
+                    'Table': table_name,
+                    'Column': column,
+                    'Check': check,
+                    'Rows_Checked': len(df),
+                    'Rows_Failed': failed,
+                    'Rows_Rejected_Total': int(rejected.sum())
+                })
+
+        self.validation_report = pd.DataFrame(
+            report_data,
+            columns=['Table', 'Column', 'Check', 'Rows_Checked', 'Rows_Failed', 'Rows_Rejected_Total']
+        )
+        if quarantine_dir is not None:
+            self.validation_report.to_csv(f"{quarantine_dir}validation_report.csv", index=False)
+
+        failed_checks = self.validation_report[self.validation_report['Rows_Failed'] > 0]
+        print(f"Validation: {len(failed_checks)} failing checks across {len(table_attrs)} tables")
+        if len(failed_checks) > 0:
+            print(failed_checks.to_string(index=False))
+
+        return self.validation_report
+
+    def _validate_table(self, df, schema):
+        """Run column-wise schema checks, returning the rejected-row mask, reasons for rejected rows and per-check failure counts"""
+
+        missing = [column for column, spec in schema.items()
+                   if spec.get('required') and column not in df.columns]
+        if missing:
+            raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+        rejected = np.zeros(len(df), dtype=bool)
+        failures = []
+        check_counts = {}
+
+        for column, spec in schema.items():
+            # Free-text columns carry no checks; absent optional columns have nothing to check
+            if not spec or column not in df.columns:
+                continue
+
+            # Fact-table columns repeat a few values many times: check each distinct value once,
+            # unless a sample shows the column is mostly distinct and factorizing would not pay off
+            sample = df[column].iloc[:10000]
+            if sample.nunique(dropna=False) * 2 <= len(sample):
+                codes, uniques = pd.factorize(df[column], use_na_sentinel=False)
+                checks = [(check, failed[codes]) for check, failed in self._column_checks(pd.Series(uniques), spec)]
+            else:
+                checks = self._column_checks(df[column].reset_index(drop=True), spec)
+
+            for check, failed in checks:
+                check_counts[(column, check)] = int(failed.sum())
+                if failed.any():
+                    failures.append((f"{column}: failed {check}; ", failed))
+                    rejected |= failed
+
+        # Reason strings are only built for rejected rows, once per distinct combination of failed checks
+        rejected_pos = np.flatnonzero(rejected)
+        combination = np.zeros(len(rejected_pos), dtype=np.int64)
+        for bit, (_, failed) in enumerate(failures):
+            combination |= failed[rejected_pos].astype(np.int64) << bit
+        combos, combo_codes = np.unique(combination, return_inverse=True)
+        combo_reasons = np.array([''.join(reason for bit, (reason, _) in enumerate(failures) if int(combo) >> bit & 1)
+                                  for combo in combos], dtype=object)
+        reasons = pd.Series(combo_reasons[combo_codes], index=rejected_pos, dtype=object)
+
+        return rejected, reasons, check_counts
+
+    def _column_checks(self, values, spec):
+        """Evaluate one column spec over a Series, returning (check, failed mask) pairs"""
+
+        if pd.api.types.is_numeric_dtype(values):
+            # Already parsed by read_csv: skip the string round trip
+            text = None
+            is_null = values.isna().to_numpy()
+        else:
+            text = values.astype('string').str.strip()
+            is_null = (text.isna() | text.str.lower().isin(NULL_MARKERS)).fillna(True).to_numpy(dtype=bool)
+
+        checks = []
+        if spec.get('required'):
+            checks.append(('required', is_null))
+        if spec.get('numeric'):
+            if text is None:
+                numbers = values
+            else:
+                # Regex match plus a plain cast avoids to_numeric's slow object-string parsing
+                cleaned = text.str.replace(',', '', regex=False)
+                is_number = cleaned.str.fullmatch(NUMBER_PATTERN).fillna(False).to_numpy(dtype=bool)
+                numbers = cleaned.where(is_number).astype('float64[pyarrow]')
+                checks.append(('numeric', ~is_null & ~is_number))
+            if 'min' in spec:
+                checks.append(('min', (numbers < spec['min']).fillna(False).to_numpy(dtype=bool)))
+        if text is None and ('allowed' in spec or 'pattern' in spec):
+            text = values.astype('string')
+        if 'allowed' in spec:
+            allowed = text.isin(spec['allowed']).fillna(False).to_numpy(dtype=bool)
+            checks.append(('allowed', ~is_null & ~allowed))
+        if 'pattern' in spec:
+            matches = text.str.contains(spec['pattern'], regex=True).fillna(False).to_numpy(dtype=bool)
+            checks.append(('pattern', ~is_null & ~matches))
+
+        return checks
+
+    def clean_data(self, workers=None):
         """Clean all dataframes"""
         
-        # Clean advertisers data
-        self.advertisers_df['risk_score'] = self.advertisers_df['health_social_risk'].apply(self._risk_to_score)
-        self.advertisers_df['influence_score'] = self.advertisers_df['celebrity_influence'].apply(self._influence_to_score)
-        
-        # Clean contracts data
-        self.contracts_df['amount_numeric'] = self.contracts_df['amount_in_crores_2025'].apply(self._convert_amount)
+        # Sharded mode: same converters, applied to row partitions on a process pool
+        if workers is not None and workers > 1:
+            self._clean_data_sharded(workers)
+            return
         
-        # Clean revenue data
-        self.revenue_df['revenue_numeric'] = self.revenue_df['latest_annual_revenue'].apply(self._extract_revenue)
+        # Clean advertisers, contracts and revenue data
+        for attr, steps in CLEANING_STEPS.items():
+            self._apply_cleaning_steps(getattr(self, attr), steps)
+    
+    def _apply_cleaning_steps(self, df, steps):
+        """Add each derived column by applying its converter to the source column"""
+        for derived, source, method in steps:
+            df[derived] = df[source].apply(getattr(self, method))
+    
+    def _clean_data_sharded(self, workers):
+        """Clean row partitions of each table in worker processes, exchanging columns as Arrow IPC in shared memory"""
+        from concurrent.futures import ProcessPoolExecutor, wait
+        from multiprocessing import shared_memory
+        
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for attr, steps in CLEANING_STEPS.items():
+                df = getattr(self, attr)
+                if len(df) == 0:
+                    self._apply_cleaning_steps(df, steps)
+                    continue
+                
+                source_columns = list(dict.fromkeys(source for _, source, _ in steps))
+                shm, size = _write_shared_arrow(df[source_columns])
+                blocks = []
+                try:
+                    bounds = np.linspace(0, len(df), min(workers, len(df)) + 1).astype(int)
+                    futures = [pool.submit(_clean_shard, shm.name, size, start, stop, steps)
+                               for start, stop in zip(bounds[:-1], bounds[1:])]
+                    
+                    # Let every shard finish so all result blocks are known before any error is raised
+                    wait(futures)
+                    blocks = [future.result() for future in futures if future.exception() is None]
+                    for future in futures:
+                        if future.exception() is not None:
+                            raise future.exception()
+                    
+                    shards = [_read_shared_arrow(name, block_size) for name, block_size in blocks]
+                finally:
+                    shm.close()
+                    shm.unlink()
+                    for name, _ in blocks:
+                        block = shared_memory.SharedMemory(name=name)
+                        block.close()
+                        block.unlink()
+                
+                for derived, _, _ in steps:
+                    df[derived] = np.concatenate([shard[derived].to_numpy() for shard in shards])
     
     def _risk_to_score(self, risk_str):
         """Convert risk string to numeric score"""
@@ -99,22 +455,27 @@ class IPLAnalysisGenerator:
     
     def _convert_amount(self, amount_str):
         """Convert amount to numeric"""
-        if pd.isna(amount_str) or str(amount_str).lower() == 'n/a':
-            return 0
-        try:
-            return float(str(amount_str).replace(',', ''))
-        except:
+        if pd.isna(amount_str) or str(amount_str).strip().lower() in NULL_MARKERS:
             return 0
+        # Unparseable amounts are quarantined by validate_data, so errors here are real bugs
+        return float(str(amount_str).replace(',', ''))
     
     def _extract_revenue(self, revenue_str):
-        """Extract revenue from string"""
+        """Extract revenue in crores from string"""
         if pd.isna(revenue_str) or 'Not disclosed' in str(revenue_str):
             return 0
-        import re
-        numbers = re.findall(r'[\d,]+', str(revenue_str))
-        if numbers:
-            return float(numbers[0].replace(',', ''))
-        return 0
+        text = str(revenue_str).lower()
+        # Other currencies cannot be put on the crore scale
+        if '$' in text or 'usd' in text:
+            return np.nan
+        match = re.search(REVENUE_AMOUNT_PATTERN, text)
+        if not match:
+            # Neither can a figure without a recognised unit
+            return np.nan if re.search(r'\d', text) else 0
+        rupees = float(match.group(1).replace(',', ''))
+        for unit in re.findall(r'[a-z]+', match.group(2)):
+            rupees *= REVENUE_UNITS_RS[unit.rstrip('s') if unit not in REVENUE_UNITS_RS else unit]
+        return rupees / REVENUE_UNITS_RS['crore']
 
     # PRIMARY ANALYSIS TABLES
     
@@ -195,26 +556,21 @@ class IPLAnalysisGenerator:
     def create_cagr_projection_table(self):
         """Question 3: CAGR projections for high-risk companies"""
         
-        cagr_data = []
-        for company, data in self.cagr_data.items():
-            current = data['current']
-            cagr_min = data['cagr_min']
-            cagr_max = data['cagr_max']
-            
-            # Calculate 2030 projections (5 years)
-            future_min = current * ((1 + cagr_min/100) ** 5)
-            future_max = current * ((1 + cagr_max/100) ** 5)
-            
-            cagr_data.append({
-                'Company': company,
-                'Current_Revenue_Cr': current,
-                'CAGR_Range': f"{cagr_min}-{cagr_max}%",
-                'Projected_2030_Min_Cr': round(future_min, 0),
-                'Projected_2030_Max_Cr': round(future_max, 0),
-                'Risk_Category': self._get_company_risk_category(company)
-            })
-        
-        cagr_df = pd.DataFrame(cagr_data)
+        companies = list(self.cagr_data)
+        current = np.array([data['current'] for data in self.cagr_data.values()], dtype=float)
+        cagr = RangeArray([data['cagr_min'] for data in self.cagr_data.values()],
+                          [data['cagr_max'] for data in self.cagr_data.values()])
+        
+        # Calculate 2030 projections (5 years)
+        projected = ((cagr.scale(1 / 100) + 1) ** 5).scale(current).round(0)
+        
+        cagr_df = pd.DataFrame({
+            'Company': companies,
+            'Current_Revenue_Cr': [data['current'] for data in self.cagr_data.values()],
+            **cagr.to_columns('CAGR', 'Pct'),
+            **projected.to_columns('Projected_2030', 'Cr'),
+            'Risk_Category': [self._get_company_risk_category(company) for company in companies]
+        })
         cagr_df = cagr_df.sort_values('Current_Revenue_Cr', ascending=False)
         
         self.tables['Q3_CAGR'] = cagr_df
@@ -222,56 +578,56 @@ class IPLAnalysisGenerator:
     
     def _get_company_risk_category(self, company):
         """Get risk category for company"""
-        if 'Dream11' in company or 'Circle' in company or 'Poker' in company:
-            return 'Gaming/Betting'
-        elif 'Vimal' in company or 'Kamla' in company:
-            return 'Pan Masala'
-        else:
-            return 'Other'
+        return classify_risk_category([company])[0]
     
-    def create_population_impact_table(self):
-        """Question 4: Population negatively impacted"""
+    def apply_exposure_sketches(self, sketches, heavy_spend_threshold=8000):
+        """Replace estimated users and impact rates with sketch-measured values"""
         
-        impact_data = []
-        total_gaming_impact = [0, 0]
-        total_pan_masala_impact = [0, 0]
-        
-        for brand, data in self.population_impact.items():
-            users = data['users']
-            impact_min = (data['impact_rate'][0] / 100) * users
-            impact_max = (data['impact_rate'][1] / 100) * users
+        for brand, sketch in sketches.items():
+            entry = dict(self.population_impact.get(brand, {'impact_rate': [0, 0]}))
+            entry['users'] = round(sketch['users'].count() / 1e6, 1)
             
-            impact_type = 'Financial losses, addiction' if any(x in brand for x in ['Dream11', 'Circle', 'Poker']) else 'Health issues, cancer risk'
-            category = 'Gaming/Betting' if 'Financial' in impact_type else 'Pan Masala'
+            # Heavy spenders: share of users whose total spend is above the threshold
+            if sketch['spend'].count:
+                heavy_rate = round((1 - sketch['spend'].rank(heavy_spend_threshold)) * 100, 1)
+                entry['impact_rate'] = [heavy_rate, heavy_rate]
+                entry['rank_error_pct'] = round(sketch['spend'].rank_error() * 100, 1)
+                print(f"{brand}: {heavy_rate}% heavy spenders (worst-case rank error ±{entry['rank_error_pct']} pts)")
             
-            impact_data.append({
-                'Brand': brand,
-                'Total_Users_Million': users,
-                'Impact_Rate_Range': f"{data['impact_rate'][0]}-{data['impact_rate'][1]}%",
-                'Affected_Min_Million': round(impact_min, 1),
-                'Affected_Max_Million': round(impact_max, 1),
-                'Impact_Type': impact_type,
-                'Category': category
-            })
-            
-            if category == 'Gaming/Betting':
-                total_gaming_impact[0] += impact_min
-                total_gaming_impact[1] += impact_max
-            else:
-                total_pan_masala_impact[0] += impact_min
-                total_pan_masala_impact[1] += impact_max
+            self.population_impact[brand] = entry
         
-        impact_df = pd.DataFrame(impact_data)
+        return self.population_impact
+    
+    def create_population_impact_table(self):
+        """Question 4: Population negatively impacted"""
+        
+        brands = list(self.population_impact)
+        users = np.array([data['users'] for data in self.population_impact.values()], dtype=float)
+        impact_rate = RangeArray([data['impact_rate'][0] for data in self.population_impact.values()],
+                                 [data['impact_rate'][1] for data in self.population_impact.values()])
+        affected = impact_rate.scale(users / 100)
+        
+        is_gaming = classify_risk_category(brands) == 'Gaming/Betting'
+        
+        impact_df = pd.DataFrame({
+            'Brand': brands,
+            'Total_Users_Million': [data['users'] for data in self.population_impact.values()],
+            **impact_rate.to_columns('Impact_Rate', 'Pct'),
+            **affected.round(1).to_columns('Affected', 'Million'),
+            'Impact_Type': np.where(is_gaming, 'Financial losses, addiction', 'Health issues, cancer risk'),
+            'Category': np.where(is_gaming, 'Gaming/Betting', 'Pan Masala')
+        })
         impact_df = impact_df.sort_values('Total_Users_Million', ascending=False)
         
         # Add summary
-        total_impact_min = total_gaming_impact[0] + total_pan_masala_impact[0]
-        total_impact_max = total_gaming_impact[1] + total_pan_masala_impact[1]
+        gaming_impact = RangeArray(affected.low[is_gaming], affected.high[is_gaming]).sum()
+        pan_masala_impact = RangeArray(affected.low[~is_gaming], affected.high[~is_gaming]).sum()
+        total_impact = gaming_impact + pan_masala_impact
         
         print(f"\nPopulation Impact Summary:")
-        print(f"Gaming/Betting Impact: {total_gaming_impact[0]:.1f}-{total_gaming_impact[1]:.1f} million")
-        print(f"Pan Masala Impact: {total_pan_masala_impact[0]:.1f}-{total_pan_masala_impact[1]:.1f} million")
-        print(f"Total Negatively Impacted: {total_impact_min:.1f}-{total_impact_max:.1f} million Indians")
+        print(f"Gaming/Betting Impact: {gaming_impact.low[0]:.1f}-{gaming_impact.high[0]:.1f} million")
+        print(f"Pan Masala Impact: {pan_masala_impact.low[0]:.1f}-{pan_masala_impact.high[0]:.1f} million")
+        print(f"Total Negatively Impacted: {total_impact.low[0]:.1f}-{total_impact.high[0]:.1f} million Indians")
         
         self.tables['Q4_Population_Impact'] = impact_df
         return impact_df
@@ -310,31 +666,23 @@ class IPLAnalysisGenerator:
     def create_public_health_cost_table(self):
         """Secondary Q1: Public health implications"""
         
-        health_cost_data = [
-            {
-                'Product_Category': 'Pan Masala Products',
-                'Annual_Health_Cost_Cr': '25,000-30,000',
-                'Population_Affected_Million': '87-101',
-                'Primary_Health_Issues': 'Cancer, oral diseases, respiratory issues',
-                'Cost_Per_Person_Rs': '2,500-3,500'
-            },
-            {
-                'Product_Category': 'Gaming/Betting Apps',
-                'Annual_Health_Cost_Cr': '8,000-12,000',
-                'Population_Affected_Million': '41-53',
-                'Primary_Health_Issues': 'Mental health, financial stress, addiction',
-                'Cost_Per_Person_Rs': '1,800-2,500'
-            },
-            {
-                'Product_Category': 'Sugary FMCG Products',
-                'Annual_Health_Cost_Cr': '15,000-20,000',
-                'Population_Affected_Million': '200+',
-                'Primary_Health_Issues': 'Diabetes, obesity, dental issues',
-                'Cost_Per_Person_Rs': '750-1,000'
-            }
-        ]
+        annual_cost = RangeArray([25000, 8000, 15000], [30000, 12000, 20000])
+        population = RangeArray([87, 41, 200], [101, 53, np.inf])
+        
+        # Crores over millions of people, in rupees
+        cost_per_person = ((annual_cost * 1e7) / (population * 1e6)).round(0)
         
-        health_df = pd.DataFrame(health_cost_data)
+        health_df = pd.DataFrame({
+            'Product_Category': ['Pan Masala Products', 'Gaming/Betting Apps', 'Sugary FMCG Products'],
+            **annual_cost.to_columns('Annual_Health_Cost', 'Cr'),
+            **population.to_columns('Population_Affected', 'Million'),
+            'Primary_Health_Issues': [
+                'Cancer, oral diseases, respiratory issues',
+                'Mental health, financial stress, addiction',
+                'Diabetes, obesity, dental issues'
+            ],
+            **cost_per_person.to_columns('Cost_Per_Person', 'Rs')
+        })
         
         self.tables['S1_Health_Costs'] = health_df
         return health_df
@@ -484,6 +832,108 @@ class IPLAnalysisGenerator:
         self.tables['S2_Tax_Revenue'] = tax_df
         return tax_df
 
+    def create_income_impact_table(self):
+        """Secondary Q3: Affected population and spending burden by income group"""
+
+        # Parse demography ranges into numeric intervals
+        segments = self.summary_df.copy()
+        segments['income_low'], segments['income_high'] = parse_ranges(segments['annual_income'], INCOME_UNITS)
+        segments['population_low'], segments['population_high'] = parse_ranges(segments['estimated_user_population'])
+        segments['group_key'] = segments['income_group'].astype('string').str.strip().str.lower()
+        dims = [c for c in SEGMENT_COLUMNS if c in segments.columns]
+
+        # Inverted ranges cannot form intervals; flag and leave them out
+        inverted = ((segments['income_low'] > segments['income_high']) |
+                    (segments['population_low'] > segments['population_high']))
+        if inverted.any():
+            print(f"Skipping {int(inverted.sum())} demography rows with inverted income/population ranges: "
+                  f"{', '.join(segments.loc[inverted, 'income_group'].astype(str))}")
+            segments = segments[~inverted]
+
+        groups = segments.drop_duplicates('group_key').reset_index(drop=True)
+        income_index = pd.IntervalIndex.from_arrays(groups['income_low'], groups['income_high'], closed='left')
+
+        # One row per (company, targeted income token)
+        targets = self.revenue_df[['company', 'sector', 'income_group', 'age_group', 'revenue_numeric']].copy()
+        targets['token'] = targets['income_group'].astype('string').str.split(r'[,/;&]|\band\b', regex=True)
+        targets = targets.explode('token').reset_index(drop=True)
+        targets['token'] = targets['token'].str.strip().str.lower()
+
+        # Tokens naming a group join by name; income ranges join by overlap with the interval index
+        token_low, token_high = parse_ranges(targets['token'], INCOME_UNITS)
+        name_match = targets['token'].to_numpy(dtype=object)[:, None] == groups['group_key'].to_numpy(dtype=object)[None, :]
+        # Brackets are closed on the left: a range must reach past a bracket's start to overlap
+        # it, while a single value overlaps the bracket that contains it
+        left = income_index.left.to_numpy()[None, :]
+        right = income_index.right.to_numpy()[None, :]
+        is_point = (token_low == token_high)[:, None]
+        range_match = ((token_low[:, None] < right) &
+                       ((token_high[:, None] > left) | (is_point & (token_low[:, None] >= left))))
+        match = np.where(name_match.any(axis=1)[:, None], name_match, range_match)
+        target_pos, group_pos = np.nonzero(match)
+
+        pairs = targets.iloc[target_pos][['company', 'sector', 'age_group', 'revenue_numeric']].reset_index(drop=True)
+        pairs['group_key'] = groups['group_key'].to_numpy()[group_pos]
+        pairs = pairs.drop_duplicates(['company', 'group_key'])
+
+        joined = pairs.merge(segments, on='group_key', suffixes=('_target', ''))
+
+        # Finer-grained files: keep only segments whose age band overlaps the company's target ages
+        if 'age_group' in dims and len(joined):
+            target_ages = RangeArray.from_strings(joined['age_group_target'])
+            segment_ages = RangeArray.from_strings(joined['age_group'])
+            unknown = np.isnan(target_ages.low) | np.isnan(segment_ages.low)
+            joined = joined[unknown | target_ages.overlaps(segment_ages)]
+
+        # Attribute each company's revenue across its segments in proportion to population
+        population_mid = pd.Series(RangeArray(joined['population_low'], joined['population_high']).midpoint(),
+                                   index=joined.index)
+        company_population = population_mid.groupby(joined['company']).transform('sum')
+        joined = joined.assign(
+            revenue_share=joined['revenue_numeric'] * population_mid / company_population.where(company_population > 0),
+            high_risk_company=joined['company'].where(
+                classify_risk_category(joined['company'].astype(str) + ' ' + joined['sector'].astype(str)) != 'Other'
+            )
+        )
+
+        segment_keys = ['income_group'] + dims
+        attributed = joined.groupby(segment_keys, sort=False).agg(
+            Companies_Targeting=('company', 'nunique'),
+            High_Risk_Companies=('high_risk_company', 'nunique'),
+            Revenue_Attributed_Cr=('revenue_share', 'sum')
+        ).reset_index()
+
+        impact_df = segments[segment_keys + ['income_low', 'income_high', 'population_low', 'population_high']]
+        impact_df = impact_df.merge(attributed, on=segment_keys, how='left')
+        impact_df[['Companies_Targeting', 'High_Risk_Companies', 'Revenue_Attributed_Cr']] = impact_df[
+            ['Companies_Targeting', 'High_Risk_Companies', 'Revenue_Attributed_Cr']].fillna(0)
+
+        exposed = impact_df['High_Risk_Companies'] > 0
+        population_mid = pd.Series(RangeArray(impact_df['population_low'], impact_df['population_high']).midpoint(),
+                                   index=impact_df.index)
+        income_mid = pd.Series(RangeArray(impact_df['income_low'], impact_df['income_high']).midpoint(),
+                               index=impact_df.index)
+
+        # Crores -> rupees over millions of people
+        spend_per_person = (impact_df['Revenue_Attributed_Cr'] * 1e7) / (population_mid * 1e6)
+
+        impact_df = pd.DataFrame({
+            **{column: impact_df[column] for column in segment_keys},
+            **RangeArray(impact_df['population_low'], impact_df['population_high']).to_columns('Population', 'Million'),
+            'Companies_Targeting': impact_df['Companies_Targeting'].astype(int),
+            'High_Risk_Companies': impact_df['High_Risk_Companies'].astype(int),
+            'Affected_Min_Million': impact_df['population_low'].where(exposed, 0),
+            'Affected_Max_Million': impact_df['population_high'].where(exposed, 0),
+            'Revenue_Attributed_Cr': impact_df['Revenue_Attributed_Cr'].round(1),
+            'Spend_Per_Person_Rs': spend_per_person.round(0),
+            'Spend_Pct_Of_Income': (spend_per_person / income_mid.where(income_mid > 0) * 100).round(2)
+        }).rename(columns={'income_group': 'Income_Group'})
+
+        impact_df = impact_df.sort_values('Affected_Max_Million', ascending=False)
+
+        self.tables['S3_Income_Impact'] = impact_df
+        return impact_df
+
     # EXPECTED OUTCOMES TABLES
     
     def create_balanced_scorecard(self):
@@ -709,6 +1159,9 @@ class IPLAnalysisGenerator:
     def generate_all_tables(self):
         """Generate all analysis tables"""
         
+        # Tables are printed straight from each create_* call and not kept in locals,
+        # so a TableStore can free them once they leave its cache
+        
         print("=" * 60)
         print("IPL 2025 COMPREHENSIVE ANALYSIS")
         print("=" * 60)
@@ -719,24 +1172,19 @@ class IPLAnalysisGenerator:
         print("="*40)
         
         print("\n1. Revenue from Central Contracts:")
-        revenue_table = self.create_revenue_table()
-        print(revenue_table.to_string(index=False))
+        print(format_range_columns(self.create_revenue_table()).to_string(index=False))
         
         print("\n\n2. Health/Social Risk Index:")
-        risk_table = self.create_risk_index_table()
-        print(risk_table.to_string(index=False))
+        print(format_range_columns(self.create_risk_index_table()).to_string(index=False))
         
         print("\n\n3. CAGR Projections (2025-2030):")
-        cagr_table = self.create_cagr_projection_table()
-        print(cagr_table.to_string(index=False))
+        print(format_range_columns(self.create_cagr_projection_table()).to_string(index=False))
         
         print("\n\n4. Population Impact Analysis:")
-        population_table = self.create_population_impact_table()
-        print(population_table.to_string(index=False))
+        print(format_range_columns(self.create_population_impact_table()).to_string(index=False))
         
         print("\n\n5. Celebrity Endorsement Analysis:")
-        celebrity_table = self.create_celebrity_analysis_table()
-        print(celebrity_table.to_string(index=False))
+        print(format_range_columns(self.create_celebrity_analysis_table()).to_string(index=False))
         
         # Secondary Analysis
         print("\n\n" + "="*40)
@@ -744,24 +1192,22 @@ class IPLAnalysisGenerator:
         print("="*40)
         
         print("\n1A. Public Health Costs:")
-        health_table = self.create_public_health_cost_table()
-        print(health_table.to_string(index=False))
+        print(format_range_columns(self.create_public_health_cost_table()).to_string(index=False))
         
         print("\n\n1B. Gambling Behavior Impact:")
-        gambling_table = self.create_gambling_behavior_table()
-        print(gambling_table.to_string(index=False))
+        print(format_range_columns(self.create_gambling_behavior_table()).to_string(index=False))
         
         print("\n\n1C. Regulatory Comparison:")
-        regulatory_table = self.create_regulatory_comparison_table()
-        print(regulatory_table.to_string(index=False))
+        print(format_range_columns(self.create_regulatory_comparison_table()).to_string(index=False))
         
         print("\n\n2A. Economic Ecosystem - Employment:")
-        employment_table = self.create_economic_ecosystem_table()
-        print(employment_table.to_string(index=False))
+        print(format_range_columns(self.create_economic_ecosystem_table()).to_string(index=False))
         
         print("\n\n2B. Tax Revenue:")
-        tax_table = self.create_tax_revenue_table()
-        print(tax_table.to_string(index=False))
+        print(format_range_columns(self.create_tax_revenue_table()).to_string(index=False))
+        
+        print("\n\n3. Income Group Impact:")
+        print(format_range_columns(self.create_income_impact_table()).to_string(index=False))
         
         # Expected Outcomes
         print("\n\n" + "="*40)
@@ -769,35 +1215,675 @@ class IPLAnalysisGenerator:
         print("="*40)
         
         print("\n1. Balanced Scorecard:")
-        scorecard_table = self.create_balanced_scorecard()
-        print(scorecard_table.to_string(index=False))
+        print(format_range_columns(self.create_balanced_scorecard()).to_string(index=False))
         
         print("\n\n2. Advertising Ethics Index:")
-        aei_table = self.create_aei_index()
-        print(aei_table.to_string(index=False))
+        print(format_range_columns(self.create_aei_index()).to_string(index=False))
         
         print("\n3. Responsible Advertising Framework:")
-        framework_table = self.create_framework_table()
-        print(framework_table.to_string(index=False))
+        print(format_range_columns(self.create_framework_table()).to_string(index=False))
         
         print("\n4. Responsible Advertising Policy Tiers:")
-        policy_table = self.create_policy_tiers_table()
-        print(policy_table.to_string(index=False))
+        print(format_range_columns(self.create_policy_tiers_table()).to_string(index=False))
         
         print("\n5. Player Endorsement Evaluation Framework:")
-        player_framework_table = self.create_player_evaluation_framework()
-        print(player_framework_table.to_string(index=False))
+        print(format_range_columns(self.create_player_evaluation_framework()).to_string(index=False))
         
         return self.tables
     
-    def save_all_tables(self, output_dir='./'):
+    def save_all_tables(self, output_dir='./', format_ranges=False):
         """Save all tables to CSV files"""
         
         for table_name, df in self.tables.items():
             filename = f"{output_dir}{table_name}.csv"
+            # Ranges stay as numeric _Min/_Max columns unless display strings are requested
+            if format_ranges:
+                df = format_range_columns(df)
             df.to_csv(filename, index=False)
             print(f"Saved: {filename}")
     
+    def export_arrow_tables(self, output_dir='./'):
+        """Save all tables as memory-mappable Arrow IPC files with a catalog.json"""
+        import pyarrow as pa
+        
+        catalog = {'tables': []}
+        for table_name, df in self.tables.items():
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            filename = f"{table_name}.arrow"
+            
+            # Uncompressed IPC file format so readers can map columns without copying
+            with pa.OSFile(f"{output_dir}{filename}", 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            
+            catalog['tables'].append({
+                'name': table_name,
+                'file': filename,
+                'num_rows': table.num_rows,
+                'schema': [{'name': field.name, 'type': str(field.type)} for field in table.schema]
+            })
+            print(f"Exported: {output_dir}{filename}")
+        
+        with open(f"{output_dir}catalog.json", 'w') as catalog_file:
+            json.dump(catalog, catalog_file, indent=2)
+        
+        return catalog
+    
+    def load_arrow_tables(self, output_dir='./', table_names=None, columns=None):
+        """Load tables from an export_arrow_tables run without re-running any create_* method"""
+        
+        for entry in read_arrow_catalog(output_dir)['tables']:
+            if table_names is not None and entry['name'] not in table_names:
+                continue
+            table = _open_arrow_file(f"{output_dir}{entry['file']}", columns)
+            self.tables[entry['name']] = table.to_pandas()
+        
+        return self.tables
+    
+
+# RISK CLASSIFICATION
+
+def classify_risk_category(names):
+    """Risk category ('Gaming/Betting', 'Pan Masala' or 'Other') for company/sector names"""
+
+    text = pd.Series(names, dtype='string')
+    conditions = [text.str.contains(pattern, case=False, regex=True).fillna(False).to_numpy(dtype=bool)
+                  for pattern in RISK_CATEGORY_PATTERNS.values()]
+    return np.select(conditions, list(RISK_CATEGORY_PATTERNS), default='Other')
+
+
+# SHARDED CLEANING
+
+def _write_shared_arrow(df):
+    """Serialize a DataFrame as an Arrow IPC stream straight into a new shared memory block"""
+    import pyarrow as pa
+    from multiprocessing import shared_memory
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    # Size the block first so the stream is written once, directly into shared memory
+    mock = pa.MockOutputStream()
+    with pa.ipc.new_stream(mock, table.schema) as writer:
+        writer.write_table(table)
+    size = mock.size()
+
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    target = pa.py_buffer(shm.buf)
+    stream = pa.FixedSizeBufferWriter(target)
+    with pa.ipc.new_stream(stream, table.schema) as writer:
+        writer.write_table(table)
+    stream.close()
+    del stream, target
+    return shm, size
+
+
+def _read_shared_arrow(name, size, start=0, stop=None):
+    """Map an Arrow IPC stream from shared memory and copy rows [start, stop) out as a DataFrame"""
+    import pyarrow as pa
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        view = shm.buf[:size]
+        buffer = pa.py_buffer(view)
+        reader = pa.ipc.open_stream(buffer)
+        table = reader.read_all()
+        if stop is not None:
+            table = table.slice(start, stop - start)
+        # Copy columns out as plain numpy arrays; Arrow-backed pandas columns would keep pointing into the block
+        df = pd.DataFrame({column: np.array(table.column(column).to_numpy(), copy=True)
+                           for column in table.column_names})
+        # Drop every reference into the block before it is closed
+        del table, reader, buffer
+        view.release()
+    finally:
+        shm.close()
+    return df
+
+
+def _clean_shard(name, size, start, stop, steps):
+    """Process-pool worker: apply cleaning converters to one row partition"""
+
+    source = _read_shared_arrow(name, size, start, stop)
+    cleaner = IPLAnalysisGenerator()
+    result = pd.DataFrame({
+        derived: source[column].apply(getattr(cleaner, method)).to_numpy()
+        for derived, column, method in steps
+    })
+
+    shm, result_size = _write_shared_arrow(result)
+    shm.close()
+    return shm.name, result_size
+
+
+# NUMERIC RANGES
+
+def parse_ranges(series, units=None):
+    """Parse range strings ('87-101', '200+', '₹50,000 - ₹2.5 lakh') into low/high float arrays"""
+
+    text = series.astype('string').str.lower().str.replace(',', '', regex=False)
+    numbers = text.str.extract(
+        r'(?P<low>\d+(?:\.\d+)?)\s*(?P<low_unit>(?!to\b)[a-z]*)'
+        r'(?:\s*(?:-|–|to)\s*₹?\s*(?P<high>\d+(?:\.\d+)?)\s*(?P<high_unit>[a-z]*))?'
+    )
+    low = pd.to_numeric(numbers['low'], errors='coerce').to_numpy(dtype=float)
+    high = pd.to_numeric(numbers['high'], errors='coerce').to_numpy(dtype=float)
+    single = np.isnan(high)
+
+    # Each bound carries its own unit; a bare lower bound shares the upper bound's
+    # ('5-10 lakh') unless that would put it above the upper bound ('50000 - 2.5 lakh')
+    if units:
+        low_factor = _unit_factors(numbers['low_unit'], units)
+        high_factor = np.where(single, low_factor, _unit_factors(numbers['high_unit'], units))
+        high_factor = np.where(np.isnan(high_factor), 1.0, high_factor)
+        shares_unit = np.isnan(low_factor) & ~(low * high_factor > high * high_factor)
+        low_factor = np.where(shares_unit, high_factor, np.where(np.isnan(low_factor), 1.0, low_factor))
+        low = low * low_factor
+        high = high * high_factor
+
+    # Single values are degenerate ranges unless marked open-ended
+    high = np.where(single, low, high)
+    upper_only = single & text.str.contains(r'<|below|under|up to|less than', regex=True).fillna(False).to_numpy(dtype=bool)
+    lower_only = single & text.str.contains(r'\+|>|above|over|more than', regex=True).fillna(False).to_numpy(dtype=bool)
+    low = np.where(upper_only, 0.0, low)
+    high = np.where(lower_only, np.inf, high)
+
+    return low, high
+
+
+def _unit_factors(words, units):
+    """Multiplier for each unit word ('lakhs' -> units['lakh']), NaN where there is none"""
+
+    return pd.to_numeric(words.str.rstrip('s').map(units), errors='coerce').to_numpy(dtype=float)
+
+
+class RangeArray:
+    """Numeric ranges as paired low/high float arrays with vectorized arithmetic"""
+
+    def __init__(self, low, high=None):
+        self.low = np.asarray(low, dtype=float)
+        self.high = self.low.copy() if high is None else np.asarray(high, dtype=float)
+
+    @classmethod
+    def from_strings(cls, series, units=None):
+        """Build from display strings such as '25,000-30,000' or '200+'"""
+        return cls(*parse_ranges(pd.Series(series), units))
+
+    @classmethod
+    def from_columns(cls, df, name, unit=''):
+        """Build from a NAME_Min[_UNIT] / NAME_Max[_UNIT] column pair"""
+        suffix = f"_{unit}" if unit else ''
+        return cls(df[f"{name}_Min{suffix}"], df[f"{name}_Max{suffix}"])
+
+    def __len__(self):
+        return len(self.low)
+
+    def __add__(self, other):
+        if isinstance(other, RangeArray):
+            return RangeArray(self.low + other.low, self.high + other.high)
+        return RangeArray(self.low + other, self.high + other)
+
+    __radd__ = __add__
+
+    def __mul__(self, other):
+        if isinstance(other, RangeArray):
+            with np.errstate(invalid='ignore'):
+                products = np.stack([self.low * other.low, self.low * other.high,
+                                     self.high * other.low, self.high * other.high])
+            return RangeArray(products.min(axis=0), products.max(axis=0))
+        return self.scale(other)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, RangeArray):
+            # Reciprocal is only defined for ranges that exclude zero
+            positive = other.low > 0
+            with np.errstate(divide='ignore', invalid='ignore'):
+                reciprocal_low = np.where(positive, 1 / other.high, np.nan)
+                reciprocal_high = np.where(positive, 1 / other.low, np.nan)
+                products = np.stack([self.low * reciprocal_low, self.low * reciprocal_high,
+                                     self.high * reciprocal_low, self.high * reciprocal_high])
+            # A bound reached through an open-ended divisor (1/inf) is a limit, not a value: leave it NaN
+            open_ended = np.isinf(other.high)
+            from_open = np.stack([open_ended, np.zeros_like(open_ended)] * 2)
+            rows = np.arange(len(self))
+            low_at, high_at = products.argmin(axis=0), products.argmax(axis=0)
+            return RangeArray(np.where(from_open[low_at, rows], np.nan, products[low_at, rows]),
+                              np.where(from_open[high_at, rows], np.nan, products[high_at, rows]))
+        return self.scale(1 / np.asarray(other, dtype=float))
+
+    def __pow__(self, exponent):
+        # Monotonic for the non-negative bases used here (growth factors)
+        return RangeArray(self.low ** exponent, self.high ** exponent)
+
+    def scale(self, factor):
+        """Multiply by a scalar or per-row array, keeping low <= high"""
+        low = self.low * factor
+        high = self.high * factor
+        return RangeArray(np.minimum(low, high), np.maximum(low, high))
+
+    def round(self, decimals=0):
+        return RangeArray(np.round(self.low, decimals), np.round(self.high, decimals))
+
+    def midpoint(self):
+        """Midpoint, falling back to the lower bound for open-ended ranges"""
+        return np.where(np.isinf(self.high), self.low, (self.low + self.high) / 2)
+
+    def overlaps(self, other):
+        return (self.low <= other.high) & (self.high >= other.low)
+
+    def __lt__(self, other):
+        """Entirely below the other range"""
+        other_low = other.low if isinstance(other, RangeArray) else other
+        return self.high < other_low
+
+    def __gt__(self, other):
+        """Entirely above the other range"""
+        other_high = other.high if isinstance(other, RangeArray) else other
+        return self.low > other_high
+
+    def sum(self):
+        return RangeArray([np.nansum(self.low)], [np.nansum(self.high)])
+
+    def to_columns(self, name, unit=''):
+        """Column dict for a NAME_Min[_UNIT] / NAME_Max[_UNIT] pair"""
+        suffix = f"_{unit}" if unit else ''
+        return {f"{name}_Min{suffix}": self.low, f"{name}_Max{suffix}": self.high}
+
+    def format(self, suffix=''):
+        """Display strings: '25,000-30,000', '200+', '15-20%'"""
+        return [_format_range(low, high, suffix) for low, high in zip(self.low, self.high)]
+
+
+def _format_number(value):
+    return f"{value:,.1f}".rstrip('0').rstrip('.')
+
+
+def _format_range(low, high, suffix=''):
+    if np.isnan(low):
+        # Only the upper bound is known, e.g. when dividing by an open-ended range
+        return '' if np.isnan(high) else f"≤{_format_number(high)}{suffix}"
+    if np.isinf(high):
+        return f"{_format_number(low)}+{suffix}"
+    if low == high:
+        return f"{_format_number(low)}{suffix}"
+    return f"{_format_number(low)}-{_format_number(high)}{suffix}"
+
+
+def format_range_columns(df):
+    """Collapse NAME_Min[_UNIT] / NAME_Max[_UNIT] column pairs into display strings"""
+
+    formatted = {}
+    for column in df.columns:
+        match = re.match(r'^(?P<name>.+)_Min(?P<unit>_[A-Za-z]+)?$', column)
+        if match:
+            unit = match.group('unit') or ''
+            max_column = f"{match.group('name')}_Max{unit}"
+            if max_column in df.columns:
+                ranges = RangeArray(df[column], df[max_column])
+                formatted[f"{match.group('name')}{unit}"] = ranges.format('%' if unit == '_Pct' else '')
+                continue
+        if re.match(r'^.+_Max(_[A-Za-z]+)?$', column) and column.replace('_Max', '_Min', 1) in df.columns:
+            continue
+        formatted[column] = df[column].to_numpy()
+
+    return pd.DataFrame(formatted, index=df.index)
+
+
+# EXPOSURE SKETCHES
+
+def _bit_length(values):
+    """Bit length of uint64 values, computed on exact 32-bit halves"""
+
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    with np.errstate(divide='ignore'):
+        high_bits = np.floor(np.log2(high)) + 33
+        low_bits = np.where(low > 0, np.floor(np.log2(low)) + 1, 0)
+    return np.where(high > 0, high_bits, low_bits).astype(np.int64)
+
+
+def hash_user_ids(user_ids):
+    """Stable 64-bit hashes of user IDs, consistent across shards and processes
+
+    IDs are hashed as text, so callers should pass them as read (e.g. dtype=str), not as floats.
+    """
+
+    return pd.util.hash_pandas_object(pd.Series(user_ids).astype(str), index=False).to_numpy(dtype=np.uint64)
+
+
+def user_shards(user_ids, n_shards):
+    """Shard number of each user ID, so a user's rows always go to the same shard"""
+
+    return hash_user_ids(user_ids) % np.uint64(n_shards)
+
+
+class HyperLogLog:
+    """Mergeable distinct-count sketch with 2**precision one-byte registers"""
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - p)) - 1)
+        rank = (64 - p) - _bit_length(rest) + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        # Linear counting is more accurate while many registers are still empty
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return float(estimate)
+
+
+class KLLSketch:
+    """Mergeable quantile sketch: levels of at most k items, level h items weigh 2**h"""
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        for h, items in enumerate(other.levels):
+            if h == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) > self.k:
+                items = np.sort(items)
+                # An odd item out stays behind; the rest halve into the next level
+                keep = items[len(items) - len(items) % 2:]
+                pairs = items[:len(items) - len(items) % 2]
+                promoted = pairs[self._rng.integers(2)::2]
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[h] = keep
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+            h += 1
+
+    def _weighted_items(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], weights[order]
+
+    def rank(self, value):
+        """Approximate fraction of values <= value"""
+        items, weights = self._weighted_items()
+        if not len(items):
+            return np.nan
+        return float(weights[items <= value].sum() / weights.sum())
+
+    def quantile(self, q):
+        items, weights = self._weighted_items()
+        if not len(items):
+            return np.nan
+        cumulative = np.cumsum(weights) / weights.sum()
+        return float(items[min(np.searchsorted(cumulative, q), len(items) - 1)])
+
+    def rank_error(self):
+        """Worst-case normalized rank error: each level's compactions shift ranks by at most n/k"""
+        return min(1.0, len(self.levels) / self.k)
+
+
+def build_exposure_sketches(log_files, brand_column='brand', user_column='user_id',
+                            spend_column='spend_rs', chunksize=1000000, sketches=None,
+                            shard=0, n_shards=1):
+    """Stream user-level exposure/spend logs once into per-brand distinct-user and spend sketches
+
+    Spend is sketched as one total per user and brand. Each file must therefore either hold
+    pre-aggregated per-user totals or be sorted by user_column, so that all of a user's rows
+    are contiguous; the user at a chunk boundary is carried into the next chunk as one
+    summed row per brand. To build sketches in parallel, give every worker the same files and
+    its own shard out of n_shards: rows are assigned by user hash, so each user lands in exactly
+    one shard and merge_exposure_sketches can combine the results.
+    """
+
+    sketches = {} if sketches is None else sketches
+    wanted = {brand_column, user_column, spend_column}
+
+    for log_file in log_files:
+        pending = None
+        # Read IDs as text so numeric IDs hash the same in every chunk and shard
+        reader = pd.read_csv(log_file, usecols=lambda column: column in wanted,
+                             dtype={user_column: str}, chunksize=chunksize)
+        for chunk in reader:
+            chunk = chunk[chunk[user_column].notna()]
+            if n_shards > 1:
+                chunk = chunk[user_shards(chunk[user_column], n_shards) == shard]
+            if pending is not None:
+                chunk = pd.concat([pending, chunk], ignore_index=True)
+            if not len(chunk):
+                continue
+
+            # Hold back the last user until the next chunk shows whether their rows continue
+            last_user = chunk[user_column].iloc[-1]
+            boundary = (chunk[user_column] == last_user).to_numpy()
+            pending = _collapse_user_rows(chunk[boundary], brand_column, user_column, spend_column)
+            _add_to_exposure_sketches(sketches, chunk[~boundary], brand_column, user_column, spend_column)
+
+        if pending is not None and len(pending):
+            _add_to_exposure_sketches(sketches, pending, brand_column, user_column, spend_column)
+
+    return sketches
+
+
+def _collapse_user_rows(rows, brand_column, user_column, spend_column):
+    """One row per brand and user, with spend summed, so a carried-over user stays bounded"""
+
+    if spend_column in rows:
+        return rows.groupby([brand_column, user_column], sort=False, as_index=False)[spend_column].sum()
+    return rows.drop_duplicates([brand_column, user_column])
+
+
+def _add_to_exposure_sketches(sketches, rows, brand_column, user_column, spend_column):
+    """Fold complete users' rows into the per-brand sketches"""
+
+    if not len(rows):
+        return
+
+    hashes = hash_user_ids(rows[user_column])
+    for brand, positions in rows.groupby(brand_column, sort=False).indices.items():
+        sketch = sketches.setdefault(brand, {'users': HyperLogLog(), 'spend': KLLSketch()})
+        sketch['users'].add_hashes(hashes[positions])
+
+    if spend_column in rows:
+        user_spend = rows.groupby([brand_column, user_column], sort=False)[spend_column].sum()
+        for brand, totals in user_spend.groupby(level=0, sort=False):
+            sketches[brand]['spend'].update(totals.to_numpy(dtype=float))
+
+
+def merge_exposure_sketches(*sketch_sets):
+    """Merge per-brand sketches built on different shards or seasons
+
+    Distinct users merge exactly. Spend merges correctly only if each user's spend was sketched
+    in exactly one set (e.g. shards built with build_exposure_sketches(shard=..., n_shards=...));
+    a user split across sets is counted as several smaller spenders.
+    """
+
+    merged = {}
+    for sketches in sketch_sets:
+        for brand, sketch in sketches.items():
+            target = merged.setdefault(brand, {'users': HyperLogLog(sketch['users'].precision),
+                                               'spend': KLLSketch(sketch['spend'].k)})
+            target['users'].merge(sketch['users'])
+            target['spend'].merge(sketch['spend'])
+    return merged
+
+
+# ARROW EXPORT
+
+def read_arrow_catalog(output_dir='./'):
+    """Read the catalog written by export_arrow_tables"""
+
+    with open(f"{output_dir}catalog.json") as catalog_file:
+        return json.load(catalog_file)
+
+
+def open_arrow_table(output_dir, table_name, columns=None, catalog=None):
+    """Memory-map an exported table, zero-copy, optionally keeping only some columns"""
+
+    catalog = read_arrow_catalog(output_dir) if catalog is None else catalog
+    entries = {entry['name']: entry for entry in catalog['tables']}
+    if table_name not in entries:
+        raise KeyError(f"{table_name} is not in {output_dir}catalog.json")
+    return _open_arrow_file(f"{output_dir}{entries[table_name]['file']}", columns)
+
+
+def _open_arrow_file(path, columns=None):
+    """Memory-map one Arrow IPC file and select columns without copying"""
+    import pyarrow as pa
+
+    source = pa.memory_map(path, 'r')
+    table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select([column for column in columns if column in table.column_names])
+    return table
+
+
+# RUN COMPARISON
+
+def load_saved_tables(output_dir='./'):
+    """Load tables written by save_all_tables back into a dict"""
+
+    tables = {}
+    for filename in sorted(glob.glob(f"{output_dir}*.csv")):
+        table_name = os.path.splitext(os.path.basename(filename))[0]
+        if table_name in TABLE_KEY_COLUMNS:
+            tables[table_name] = pd.read_csv(filename)
+    return tables
+
+
+def diff_runs(old_tables, new_tables):
+    """Diff two runs (or seasons) table by table using row hashes on key columns"""
+
+    summary_data = []
+    details = {}
+
+    for table_name in sorted(set(old_tables) | set(new_tables)):
+        old_df = old_tables.get(table_name)
+        new_df = new_tables.get(table_name)
+        reference = new_df if new_df is not None else old_df
+        # Optional key columns (e.g. demography segments) only count when the table has them
+        key_columns = [c for c in TABLE_KEY_COLUMNS.get(table_name, []) if c in reference.columns]
+        key_columns = key_columns or [reference.columns[0]]
+
+        if old_df is None:
+            old_df = reference.iloc[0:0]
+        if new_df is None:
+            new_df = reference.iloc[0:0]
+
+        added, removed, changed = _diff_table(old_df, new_df, key_columns)
+        details[table_name] = {'added': added, 'removed': removed, 'changed': changed}
+
+        summary_data.append({
+            'Table': table_name,
+            'Old_Rows': len(old_df),
+            'New_Rows': len(new_df),
+            'Added': len(added),
+            'Removed': len(removed),
+            'Changed_Rows': changed[key_columns].drop_duplicates().shape[0] if len(changed) else 0,
+            'Changed_Cells': len(changed)
+        })
+
+    summary_df = pd.DataFrame(summary_data)
+    print(summary_df.to_string(index=False))
+    return summary_df, details
+
+
+def _key_hashes(df, key_columns):
+    """Hash key columns, numbering repeated keys so every row hashes uniquely"""
+
+    keys = df[key_columns].copy()
+    keys['_occurrence'] = keys.groupby(key_columns, sort=False, dropna=False).cumcount()
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+def _diff_table(old_df, new_df, key_columns):
+    """Return added rows, removed rows and per-column deltas for changed rows"""
+
+    value_columns = [c for c in new_df.columns if c in old_df.columns and c not in key_columns]
+
+    # Hash join on key hashes: one pass over each side
+    old_index = pd.Index(_key_hashes(old_df, key_columns))
+    old_pos = old_index.get_indexer(_key_hashes(new_df, key_columns))
+    matched = old_pos >= 0
+
+    old_matched = np.zeros(len(old_df), dtype=bool)
+    old_matched[old_pos[matched]] = True
+
+    added = new_df[~matched].reset_index(drop=True)
+    removed = old_df[~old_matched].reset_index(drop=True)
+
+    new_pos = np.flatnonzero(matched)
+    old_pos = old_pos[matched]
+
+    # Row hashes over value columns prune identical rows before any per-column work
+    if value_columns and len(new_pos):
+        old_row_hash = pd.util.hash_pandas_object(old_df[value_columns], index=False).to_numpy()
+        new_row_hash = pd.util.hash_pandas_object(new_df[value_columns], index=False).to_numpy()
+        differs = old_row_hash[old_pos] != new_row_hash[new_pos]
+        new_pos = new_pos[differs]
+        old_pos = old_pos[differs]
+    else:
+        new_pos = new_pos[:0]
+        old_pos = old_pos[:0]
+
+    changed_parts = []
+    keys = new_df[key_columns].iloc[new_pos].reset_index(drop=True)
+
+    for column in value_columns:
+        old_values = old_df[column].iloc[old_pos].reset_index(drop=True)
+        new_values = new_df[column].iloc[new_pos].reset_index(drop=True)
+        unequal = (old_values != new_values) & ~(old_values.isna() & new_values.isna())
+        if not unequal.any():
+            continue
+
+        part = keys[unequal].copy()
+        part['Column'] = column
+        part['Old_Value'] = old_values[unequal].astype(object)
+        part['New_Value'] = new_values[unequal].astype(object)
+        if pd.api.types.is_numeric_dtype(old_values) and pd.api.types.is_numeric_dtype(new_values):
+            part['Delta'] = new_values[unequal] - old_values[unequal]
+        else:
+            part['Delta'] = np.nan
+        changed_parts.append(part)
+
+    if changed_parts:
+        changed = pd.concat(changed_parts, ignore_index=True)
+    else:
+        changed = pd.DataFrame(columns=key_columns + ['Column', 'Old_Value', 'New_Value', 'Delta'])
+
+    return added, removed, changed
+
 
 # USAGE EXAMPLE
 def main():